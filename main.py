@@ -19,28 +19,39 @@ HomDGCat Wiki 完整镜像工具
   - TextMap 数据 (TextMap/*.js)
   - 静态资源 (css, js, fonts, audio)
 """
-import argparse
+import base64
+import contextlib
 import gzip
+import hashlib
+import heapq
+import http.client
 import http.server
-import io
 import json
 import locale
+import operator
 import os
+import re
+import shutil
+import signal
 import socket
 import socketserver
 import sys
+import threading
 import time
+import types
 import urllib.request
-import urllib.error
+from collections import OrderedDict
 from functools import lru_cache
 from pathlib import Path
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from urllib.parse import unquote, quote
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from urllib.parse import unquote, quote, urljoin, urlsplit
 
 ROOT_DIR = Path(__file__).parent
 SITE_DIR = ROOT_DIR / "site"
 FILELIST = ROOT_DIR / "filelist.txt"
 BASE_URL = "https://homdgcat.wiki"
+# 解析一次即可，避免在逐文件的循环里重复 resolve()
+_SITE_RESOLVED = SITE_DIR.resolve()
 
 # ─── i18n ─────────────────────────────────────────────────
 
@@ -63,6 +74,8 @@ _I18N = {
                              "en": "Error: file list not found: {path}"},
     "err_filelist_hint":    {"zh": "请确保 filelist.txt 与本脚本在同一目录下。",
                              "en": "Make sure filelist.txt is in the same directory as this script."},
+    "warn_bad_paths":       {"zh": "警告: 已忽略 {n} 个非法路径（含 ..、盘符或绝对路径）",
+                             "en": "Warning: ignored {n} unsafe path(s) (containing .., a drive or an absolute path)"},
     # ── cmd_download ──
     "dl_title":             {"zh": "  HomDGCat Wiki 镜像下载",
                              "en": "  HomDGCat Wiki Mirror Download"},
@@ -71,6 +84,8 @@ _I18N = {
     "dl_pending":           {"zh": "  待下载:   {n} 个",       "en": "  Pending:    {n}"},
     "dl_workers":           {"zh": "  并发数:   {n}",          "en": "  Workers:    {n}"},
     "dl_retries":           {"zh": "  重试次数: {n}",          "en": "  Retries:    {n}"},
+    "dl_engine":            {"zh": "  引擎:     {e}",          "en": "  Engine:     {e}"},
+    "dl_threads":           {"zh": "线程池 (标准库)",   "en": "thread pool (stdlib)"},
     "dl_nothing":           {"zh": "\n所有文件已存在，无需下载。",
                              "en": "\nAll files already exist, nothing to download."},
     "dl_progress":          {"zh": "  [{i}/{total}] 成功: {ok}  404: {nf}  失败: {fail}  速度: {speed:.0f} KB/s",
@@ -81,6 +96,8 @@ _I18N = {
                              "en": "  New:    {n} ({mb:.1f} MB)"},
     "dl_404":               {"zh": "  404:  {n}",              "en": "  404:    {n}"},
     "dl_failed":            {"zh": "  失败: {n}",              "en": "  Failed: {n}"},
+    "dl_precompress":       {"zh": "  预压缩:   新生成 {n} 个 .gz 文件",
+                             "en": "  Precompressed: {n} new .gz file(s)"},
     "dl_fail_saved":        {"zh": "  失败列表已保存到 {path}",
                              "en": "  Failure list saved to {path}"},
     # ── cmd_serve ──
@@ -93,10 +110,13 @@ _I18N = {
     "srv_engine":           {"zh": "  引擎:   {e}",            "en": "  Engine:   {e}"},
     "srv_proto":            {"zh": "  协议:   {p}",            "en": "  Protocol: {p}"},
     "srv_addr":             {"zh": "  地址:   {url}",          "en": "  Address:  {url}"},
+    "srv_procs":            {"zh": "  进程数: {n}",            "en": "  Workers:  {n}"},
     "srv_hint":             {"zh": "  提示:   pip install starlette hypercorn h2\n"
                                    "          可获得异步 I/O + HTTP/2 支持",
                              "en": "  Hint:   pip install starlette hypercorn h2\n"
                                    "          for async I/O + HTTP/2 support"},
+    "srv_precompress":      {"zh": "  预压缩: 新生成 {n} 个 .gz 文件",
+                             "en": "  Gzipped:  {n} new .gz file(s)"},
     "srv_stop":             {"zh": "  按 Ctrl+C 停止",         "en": "  Press Ctrl+C to stop"},
     "srv_stopped":          {"zh": "\n服务器已停止。",          "en": "\nServer stopped."},
     "srv_fallback":         {"zh": "stdlib (回退模式)",         "en": "stdlib (fallback)"},
@@ -123,6 +143,7 @@ _I18N = {
                              "en": "TLS certificate path (enables HTTPS + HTTP/2)"},
     "ap_key":               {"zh": "TLS 私钥路径",             "en": "TLS private key path"},
     "ap_status":            {"zh": "查看下载进度",              "en": "Show download progress"},
+    "ap_positive":          {"zh": "须为正整数: {v!r}",        "en": "must be a positive integer: {v!r}"},
 }
 
 def _(key, **kw):
@@ -132,87 +153,328 @@ def _(key, **kw):
 
 # ─── 下载功能 ───────────────────────────────────────────────
 
+_DRIVE_RE = re.compile(r"[A-Za-z]:")
+
+
+def _is_safe_path(url_path):
+    """检查文件列表条目不会越出 site/ 目录。
+    拒绝 .. 片段、Windows 盘符前缀（C:）和反斜杠开头的绝对路径；
+    其余位置的 ":" 在 URL 和 POSIX 文件名中都合法，予以保留。
+    """
+    stripped = url_path.lstrip("/")
+    if _DRIVE_RE.match(stripped) or stripped.startswith("\\"):
+        return False
+    return ".." not in url_path.replace("\\", "/").split("/")
+
+
+@lru_cache(maxsize=None)
 def load_filelist():
-    """加载文件列表。"""
+    """加载文件列表（进程内只解析一次），返回保持原顺序的元组。路径穿越检查在这里一次性完成。"""
     if not FILELIST.exists():
         print(_("err_no_filelist", path=FILELIST))
         print(_("err_filelist_hint"))
         sys.exit(1)
-    paths = []
-    with open(FILELIST, "r", encoding="utf-8") as f:
-        for line in f:
-            line = line.strip()
-            if line and not line.startswith("#"):
-                paths.append(line)
-    return paths
-
-
-def download_one(url_path, retries=3):
-    """下载单个文件，返回 (状态, 路径, 信息)。
-    状态: True=新下载, None=已存在, False=失败
+    # 文件不大，一次读入后 splitlines 比逐行迭代快得多；splitlines 同时处理 CRLF
+    lines = (ln.strip() for ln in FILELIST.read_text(encoding="utf-8").splitlines())
+    entries = [ln for ln in lines if ln and not ln.startswith("#")]
+    paths = [p for p in entries if _is_safe_path(p)]
+    if len(paths) != len(entries):
+        print(_("warn_bad_paths", n=len(entries) - len(paths)))
+    # 结果被缓存共享，返回不可变的元组；同时按原顺序去重，避免同一文件被并发下载两次
+    return tuple(dict.fromkeys(paths))
+
+
+def _scan_site():
+    """一次遍历 site/，返回 {相对路径: 文件大小}，路径分隔符统一为 "/"。
+    用显式栈 + os.scandir 代替逐文件 stat，大镜像下快一个数量级。
+    """
+    present = {}
+    stack = [(str(SITE_DIR), "")]
+    while stack:
+        dir_path, prefix = stack.pop()
+        try:
+            it = os.scandir(dir_path)
+        except OSError:
+            continue
+        with it:
+            for entry in it:
+                rel = prefix + entry.name
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append((entry.path, rel + "/"))
+                    elif entry.is_file():
+                        present[rel] = entry.stat().st_size
+                except OSError:
+                    continue
+    return present
+
+
+_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)",
+    "Referer": "https://homdgcat.wiki/",
+    # 文本类资源（HTML/JS/JSON/TextMap）压缩后体积约为原来的 1/4；
+    # 落盘保存解压后的内容，本地服务器会自行重新压缩
+    "Accept-Encoding": "gzip",
+}
+
+
+def _plan_download(url_path):
+    """预先计算下载任务 (url_path, 请求 URL, 落盘路径, 临时路径)。
+    在主线程一次性完成 quote 等转换，worker 和重试时直接复用。路径越出 site/ 时返回 None。
     """
+    local_path = SITE_DIR / url_path.lstrip("/")
+    # 路径穿越防护：确保落盘路径在 site/ 内
     try:
-        local_path = SITE_DIR / url_path.lstrip("/")
-        # 路径穿越防护：确保落盘路径在 site/ 内
+        local_path.resolve().relative_to(_SITE_RESOLVED)
+    except (ValueError, OSError):
+        return None
+    # 线上路由是目录 URL（如 /sr/char/1001/），不是 .../index.html
+    # 但本地保存路径需要 index.html，所以请求时去掉
+    request_path = url_path
+    if request_path.endswith("/index.html"):
+        request_path = request_path[: -len("index.html")]
+    full_url = BASE_URL + quote(
+        request_path, safe="/:@!$&'()*+,;=-._~%"
+    )
+    tmp_path = local_path.with_suffix(local_path.suffix + ".tmp")
+    return url_path, full_url, local_path, tmp_path
+
+
+# download_one 的状态码
+DL_EXISTS, DL_NEW, DL_404, DL_FAILED = range(4)
+
+@lru_cache(maxsize=None)
+def _proxy_for(scheme, host):
+    """按 *_proxy / no_proxy 环境变量返回代理 URL（规则与 urlopen 相同），不走代理时返回 None。"""
+    if urllib.request.proxy_bypass(host):
+        return None
+    proxy = urllib.request.getproxies().get(scheme)
+    if proxy and "://" not in proxy:
+        proxy = "http://" + proxy
+    return proxy or None
+
+
+def _proxy_auth(proxy):
+    """代理 URL 含用户名密码时返回 Proxy-Authorization 头，否则返回空字典。"""
+    parts = urlsplit(proxy)
+    if parts.username is None:
+        return {}
+    cred = f"{unquote(parts.username)}:{unquote(parts.password or '')}"
+    return {"Proxy-Authorization": "Basic " + base64.b64encode(cred.encode()).decode("ascii")}
+
+
+# 每个下载线程持有自己的 keep-alive 连接，按 (scheme, host, 代理) 复用，
+# 避免每个文件都重新进行 TCP + TLS 握手
+_conn_local = threading.local()
+
+
+def _get_conn(scheme, host, proxy=None):
+    """获取当前线程可复用的持久连接。
+    走代理时连接到代理：https 通过 CONNECT 隧道，http 由调用方发送绝对 URI。
+    """
+    conns = getattr(_conn_local, "conns", None)
+    if conns is None:
+        conns = _conn_local.conns = {}
+    conn = conns.get((scheme, host, proxy))
+    if conn is None:
+        if proxy is None:
+            cls = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+            conn = cls(host, timeout=30)
+        else:
+            p = urlsplit(proxy)
+            proxy_host = p.hostname if ":" not in p.hostname else f"[{p.hostname}]"
+            if p.port:
+                proxy_host += f":{p.port}"
+            if scheme == "https":
+                conn = http.client.HTTPSConnection(proxy_host, timeout=30)
+                conn.set_tunnel(host, headers=_proxy_auth(proxy))
+            else:
+                conn = http.client.HTTPConnection(proxy_host, timeout=30)
+        conns[(scheme, host, proxy)] = conn
+    return conn
+
+
+def _reset_conns():
+    """关闭当前线程的所有连接（出错后连接状态不可信）。"""
+    for conn in getattr(_conn_local, "conns", {}).values():
+        conn.close()
+    _conn_local.conns = {}
+
+
+def _http_get(url, headers, max_redirects=5):
+    """在线程本地的持久连接上发起 GET，自动跟随重定向。
+    返回已读取响应头的 HTTPResponse，调用方需读完 body 才能复用连接。
+    """
+    for _hop in range(max_redirects + 1):
+        parts = urlsplit(url)
+        target = parts.path or "/"
+        if parts.query:
+            target += "?" + parts.query
+        proxy = _proxy_for(parts.scheme, parts.netloc)
+        conn = _get_conn(parts.scheme, parts.netloc, proxy)
+        req_headers = headers
+        if proxy is not None and parts.scheme != "https":
+            # 明文 HTTP 代理：请求行使用绝对 URI，认证头随每个请求发送
+            target = f"{parts.scheme}://{parts.netloc}{target}"
+            req_headers = {**headers, **_proxy_auth(proxy)}
+        # 复用的连接可能已被服务端关闭，此时换新连接静默重试一次
+        reused = conn.sock is not None
         try:
-            local_path.resolve().relative_to(SITE_DIR.resolve())
-        except (ValueError, OSError):
-            return False, url_path, "path traversal blocked"
+            conn.request("GET", target, headers=req_headers)
+            resp = conn.getresponse()
+        except (http.client.HTTPException, OSError):
+            conn.close()
+            if not reused:
+                raise
+            conn.request("GET", target, headers=req_headers)
+            resp = conn.getresponse()
+        if resp.status in (301, 302, 303, 307, 308):
+            location = resp.getheader("Location")
+            resp.read()
+            if not location:
+                return resp
+            url = urljoin(url, location)
+            continue
+        return resp
+    raise http.client.HTTPException(f"too many redirects: {url}")
+
+
+def download_one(job, retries=3):
+    """下载单个文件（job 由 _plan_download 生成），返回 (状态码, 信息)。
+    状态码见 DL_*；DL_NEW 时信息为字节数，DL_FAILED 时为错误描述。
+    """
+    try:
+        _url_path, full_url, local_path, tmp_path = job
         if local_path.exists() and local_path.stat().st_size > 0:
-            return None, url_path, "exists"
+            return DL_EXISTS, "exists"
         local_path.parent.mkdir(parents=True, exist_ok=True)
-        # 线上路由是目录 URL（如 /sr/char/1001/），不是 .../index.html
-        # 但本地保存路径需要 index.html，所以请求时去掉
-        request_path = url_path
-        if request_path.endswith("/index.html"):
-            request_path = request_path[: -len("index.html")]
-        full_url = BASE_URL + urllib.request.quote(
-            request_path, safe="/:@!$&'()*+,;=-._~%"
-        )
-        tmp_path = local_path.with_suffix(local_path.suffix + ".tmp")
         for attempt in range(retries):
             try:
-                req = urllib.request.Request(full_url, headers={
-                    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)",
-                    "Referer": "https://homdgcat.wiki/",
-                })
-                with urllib.request.urlopen(req, timeout=30) as resp:
-                    # 流式写入，避免大文件占满内存
+                resp = _http_get(full_url, _HEADERS)
+                if resp.status == 404:
+                    resp.read()
+                    return DL_404, "404"
+                if resp.status != 200:
+                    resp.read()
+                    raise http.client.HTTPException(f"HTTP {resp.status}")
+                # 标准库不会自动解压，gzip 响应需要包一层
+                stream = resp
+                if resp.getheader("Content-Encoding", "").lower() == "gzip":
+                    stream = gzip.GzipFile(fileobj=resp)
+                # 流式写入，避免大文件占满内存；1 MB 分块减少读写循环次数
+                with open(tmp_path, "wb") as f:
+                    shutil.copyfileobj(stream, f, 1 << 20)
+                    total = f.tell()
+                if total > 0:
+                    tmp_path.replace(local_path)
+                    return DL_NEW, total
+                tmp_path.unlink(missing_ok=True)
+                return DL_FAILED, "empty"
+            except Exception as e:
+                _reset_conns()
+                tmp_path.unlink(missing_ok=True)
+                if attempt < retries - 1:
+                    time.sleep(2 ** attempt)
+                else:
+                    return DL_FAILED, str(e)
+        return DL_FAILED, "failed"
+    except Exception as e:
+        return DL_FAILED, str(e)
+
+
+async def _download_one_async(fetch, sem, job, retries=3):
+    """download_one 的协程版本，参数与返回值约定相同。
+    fetch(url) 是异步上下文管理器，产出 (状态码, 已解压的分块异步迭代器)，
+    由 _download_async 按所选 HTTP 客户端提供。
+    """
+    import asyncio
+    try:
+        _url_path, full_url, local_path, tmp_path = job
+        if local_path.exists() and local_path.stat().st_size > 0:
+            return DL_EXISTS, "exists"
+        local_path.parent.mkdir(parents=True, exist_ok=True)
+        for attempt in range(retries):
+            try:
+                async with sem, fetch(full_url) as (status, chunks):
+                    if status == 404:
+                        return DL_404, "404"
+                    if status != 200:
+                        raise RuntimeError(f"HTTP {status}")
                     total = 0
                     with open(tmp_path, "wb") as f:
-                        while True:
-                            chunk = resp.read(65536)
-                            if not chunk:
-                                break
+                        async for chunk in chunks:
                             f.write(chunk)
                             total += len(chunk)
-                    if total > 0:
-                        tmp_path.replace(local_path)
-                        return True, url_path, total
-                    tmp_path.unlink(missing_ok=True)
-                    return False, url_path, "empty"
-            except urllib.error.HTTPError as e:
+                if total > 0:
+                    tmp_path.replace(local_path)
+                    return DL_NEW, total
                 tmp_path.unlink(missing_ok=True)
-                if e.code == 404:
-                    return False, url_path, "404"
-                if attempt < retries - 1:
-                    time.sleep(2 ** attempt)
+                return DL_FAILED, "empty"
             except Exception as e:
                 tmp_path.unlink(missing_ok=True)
                 if attempt < retries - 1:
-                    time.sleep(2 ** attempt)
+                    await asyncio.sleep(2 ** attempt)
                 else:
-                    return False, url_path, str(e)
-        return False, url_path, "failed"
+                    return DL_FAILED, str(e)
+        return DL_FAILED, "failed"
     except Exception as e:
-        return False, url_path, str(e)
+        return DL_FAILED, str(e)
+
 
+async def _download_async(jobs, workers, retries, record, engine):
+    """异步驱动：单线程内维持 workers 个并发请求，每完成一个调用 record(path, status, info)。
+    engine="httpx" 时使用 HTTP/2 多路复用（一次 TLS 握手承载所有请求），
+    engine="aiohttp" 时使用 HTTP/1.1 连接池。两者都会按 Content-Encoding 自动解压。
+    """
+    import asyncio
 
-def _file_ok(url_path):
-    """检查文件是否已正确下载（存在且非空）。"""
+    async with contextlib.AsyncExitStack() as stack:
+        if engine == "httpx":
+            import httpx
+            client = await stack.enter_async_context(httpx.AsyncClient(
+                http2=True, headers=_HEADERS, follow_redirects=True, timeout=30,
+                limits=httpx.Limits(max_connections=workers,
+                                    max_keepalive_connections=workers),
+            ))
+
+            @contextlib.asynccontextmanager
+            async def fetch(url):
+                async with client.stream("GET", url) as resp:
+                    yield resp.status_code, resp.aiter_bytes(65536)
+        else:
+            import aiohttp
+            connector = aiohttp.TCPConnector(limit=workers, ttl_dns_cache=300,
+                                             keepalive_timeout=60)
+            # 与 urllib 的 timeout=30 语义一致：限制单次连接/读取，而非整个下载
+            timeout = aiohttp.ClientTimeout(total=None, sock_connect=30, sock_read=30)
+            # trust_env: 与 urlopen / httpx 一致，读取 *_proxy 环境变量
+            session = await stack.enter_async_context(aiohttp.ClientSession(
+                connector=connector, headers=_HEADERS, timeout=timeout, trust_env=True,
+            ))
+
+            @contextlib.asynccontextmanager
+            async def fetch(url):
+                async with session.get(url) as resp:
+                    yield resp.status, resp.content.iter_chunked(65536)
+
+        # 限制同时在途的请求数，其余协程在信号量上等待，不会占用连接池超时
+        sem = asyncio.Semaphore(workers)
+
+        async def one(job):
+            record(job[0], *await _download_one_async(fetch, sem, job, retries))
+
+        await asyncio.gather(*(one(job) for job in jobs))
+
+
+def _file_ok(url_path, present=None):
+    """检查文件是否已正确下载（存在且非空）。
+    传入 _scan_site() 的结果时只做字典查找，不触发任何系统调用。
+    """
+    if present is not None:
+        return present.get(url_path.lstrip("/"), 0) > 0
     p = SITE_DIR / url_path.lstrip("/")
     try:
-        p.resolve().relative_to(SITE_DIR.resolve())
+        p.resolve().relative_to(_SITE_RESOLVED)
     except (ValueError, OSError):
         return False
     return p.exists() and p.stat().st_size > 0
@@ -221,7 +483,8 @@ def _file_ok(url_path):
 def cmd_download(args):
     """执行下载。"""
     all_paths = load_filelist()
-    to_download = [p for p in all_paths if not _file_ok(p)]
+    present = _scan_site()
+    to_download = [p for p in all_paths if not _file_ok(p, present)]
 
     print("=" * 55)
     print(_("dl_title"))
@@ -231,45 +494,81 @@ def cmd_download(args):
     print(_("dl_pending", n=len(to_download)))
     print(_("dl_workers", n=args.workers))
     print(_("dl_retries", n=args.retry))
+    # 自动选择下载引擎：httpx + h2 (HTTP/2) > aiohttp > 标准库线程池
+    engine = None
+    try:
+        import httpx, h2  # noqa: F401
+        engine = "httpx"
+    except ImportError:
+        try:
+            import aiohttp  # noqa: F401
+            engine = "aiohttp"
+        except ImportError:
+            pass
+    engine_names = {"httpx": "httpx (asyncio, HTTP/2)", "aiohttp": "aiohttp (asyncio)"}
+    print(_("dl_engine", e=engine_names.get(engine) or _("dl_threads")))
     print("=" * 55)
     sys.stdout.flush()
 
     if not to_download:
         print(_("dl_nothing"))
+        print(_("dl_precompress", n=_precompress_files(all_paths)))
         return
 
     success = 0
     not_found = 0
     failed = 0
+    done = 0
     total_bytes = 0
+    # 失败记录按列存储（路径 / 原因），避免逐条分配元组
     failed_paths = []
+    failed_info = []
     t0 = time.time()
 
-    with ThreadPoolExecutor(max_workers=args.workers) as executor:
-        futures = {
-            executor.submit(download_one, p, args.retry): p
-            for p in to_download
-        }
-        for i, future in enumerate(as_completed(futures), 1):
-            try:
-                ok, path, info = future.result()
-            except Exception as e:
-                ok, path, info = False, futures[future], str(e)
-            if ok is True:
-                success += 1
-                total_bytes += info
-            elif info == "404":
-                not_found += 1
-            elif ok is not None:
-                failed += 1
-                failed_paths.append((path, info))
-
-            if i % 200 == 0 or i == len(to_download):
-                elapsed = time.time() - t0
-                speed = total_bytes / elapsed / 1024 if elapsed > 0 else 0
-                print(_("dl_progress", i=i, total=len(to_download),
-                       ok=success, nf=not_found, fail=failed, speed=speed))
-                sys.stdout.flush()
+    def record(path, status, info):
+        nonlocal success, not_found, failed, done, total_bytes
+        done += 1
+        if status == DL_NEW:
+            success += 1
+            total_bytes += info
+        elif status == DL_404:
+            not_found += 1
+        elif status == DL_FAILED:
+            failed += 1
+            failed_paths.append(path)
+            failed_info.append(info)
+
+        if done % 200 == 0 or done == len(to_download):
+            elapsed = time.time() - t0
+            speed = total_bytes / elapsed / 1024 if elapsed > 0 else 0
+            print(_("dl_progress", i=done, total=len(to_download),
+                   ok=success, nf=not_found, fail=failed, speed=speed))
+            sys.stdout.flush()
+
+    # 请求 URL / 落盘路径在这里一次算好，worker 只负责网络 I/O
+    jobs = []
+    for p in to_download:
+        job = _plan_download(p)
+        if job is None:
+            record(p, DL_FAILED, "path traversal blocked")
+        else:
+            jobs.append(job)
+
+    if engine:
+        import asyncio
+        asyncio.run(_download_async(jobs, args.workers, args.retry, record, engine))
+    else:
+        with ThreadPoolExecutor(max_workers=args.workers) as executor:
+            futures = {
+                executor.submit(download_one, job, args.retry): job[0]
+                for job in jobs
+            }
+            for future in as_completed(futures):
+                try:
+                    status, info = future.result()
+                except Exception as e:
+                    status, info = DL_FAILED, str(e)
+                record(futures[future], status, info)
 
     elapsed = time.time() - t0
     print(f"\n{'=' * 55}")
@@ -277,12 +576,13 @@ def cmd_download(args):
     print(_("dl_new", n=success, mb=total_bytes / 1024 / 1024))
     print(_("dl_404", n=not_found))
     print(_("dl_failed", n=failed))
+    print(_("dl_precompress", n=_precompress_files(all_paths)))
     print(f"{'=' * 55}")
 
     if failed_paths:
         fail_file = ROOT_DIR / "download_failures.txt"
         with open(fail_file, "w", encoding="utf-8") as f:
-            for path, info in failed_paths:
+            for path, info in zip(failed_paths, failed_info):
                 f.write(f"{path}\t{info}\n")
         print(_("dl_fail_saved", path=fail_file))
 
@@ -308,16 +608,132 @@ _MIME_MAP = {
     ".ico": "image/x-icon",
 }
 
+# 图片/字体 7 天，JS/CSS 1 天（可能更新），页面及其他 1 小时
+_CACHE_MAX_AGE = {
+    '.png': 604800, '.jpg': 604800, '.jpeg': 604800, '.gif': 604800,
+    '.webp': 604800, '.woff': 604800, '.woff2': 604800, '.wav': 604800,
+    '.ico': 604800,
+    '.js': 86400, '.css': 86400,
+    '.html': 3600, '.json': 3600,
+}
+
+# 扩展名 → (Content-Type, 是否可 gzip, Cache-Control)，每个请求只查一次表
+_DEFAULT_ROW = ("application/octet-stream", False, "public, max-age=3600")
+_EXT_TABLE = {
+    ext: (_MIME_MAP.get(ext, _DEFAULT_ROW[0]),
+          ext in _COMPRESSIBLE,
+          f"public, max-age={_CACHE_MAX_AGE.get(ext, 3600)}")
+    for ext in set(_MIME_MAP) | _COMPRESSIBLE | _STATIC_BIN | set(_CACHE_MAX_AGE)
+}
 
-@lru_cache(maxsize=1024)
-def _gzip_cached(file_path_str, mtime_ns, size):
-    """带 LRU 缓存的 gzip 压缩。缓存键含 mtime+size，文件变更自动失效。"""
-    with open(file_path_str, 'rb') as f:
-        raw = f.read()
-    buf = io.BytesIO()
-    with gzip.GzipFile(fileobj=buf, mode='wb', compresslevel=6) as gz:
-        gz.write(raw)
-    return buf.getvalue()
+
+def _is_hidden(url_path):
+    """路径中任一片段以 "." 开头（如 .cache 缓存目录）时返回 True，这类路径不对外提供。"""
+    return any(seg.startswith(".") for seg in url_path.replace("\\", "/").split("/"))
+
+
+def _gzip_path(file_path_str, mtime_ns, size):
+    """返回文件的 gzip 磁盘缓存路径，缺失时以 level 9 压缩生成。
+    缓存位于 site/.cache/gzip/<路径哈希>/<mtime>-<size>.gz，源文件变更自动失效；
+    每个源文件独占一个子目录，清理旧版本时只需扫描该子目录。
+    多个进程共享同一份缓存。.cache 目录不会被服务器对外提供（见 _is_hidden）。
+    """
+    key = hashlib.sha1(file_path_str.encode("utf-8", "surrogateescape")).hexdigest()
+    key_dir = SITE_DIR / ".cache" / "gzip" / key
+    cached = key_dir / f"{mtime_ns:x}-{size:x}.gz"
+    if not cached.exists():
+        key_dir.mkdir(parents=True, exist_ok=True)
+        # 先写唯一的临时文件再原子替换，并发请求同一文件时互不干扰
+        tmp = key_dir / f"{cached.name}.{os.getpid()}-{threading.get_ident()}.tmp"
+        try:
+            with open(file_path_str, "rb") as f:
+                tmp.write_bytes(gzip.compress(f.read(), 9, mtime=0))
+            os.replace(tmp, cached)
+        finally:
+            try:
+                tmp.unlink()
+            except OSError:
+                pass
+        # 清理同一源文件的旧版本缓存，防止编辑源文件后缓存无限增长
+        with os.scandir(key_dir) as it:
+            for entry in it:
+                if entry.name.endswith(".gz") and entry.name != cached.name:
+                    try:
+                        os.unlink(entry.path)
+                    except OSError:
+                        pass
+    return cached
+
+
+def _precompress(file_path_str):
+    """为单个文本文件生成 level-9 的 .gz 旁路文件，已是最新时跳过。
+    返回是否新写入。在子进程中运行，避免压缩占用服务线程。
+    """
+    src = Path(file_path_str)
+    gz = src.with_name(src.name + ".gz")
+    # 进程唯一的临时文件名，download 与 serve 同时预压缩时互不覆盖
+    tmp = gz.with_name(f"{gz.name}.{os.getpid()}-{threading.get_ident()}.tmp")
+    try:
+        with open(src, "rb") as f:
+            st = os.fstat(f.fileno())
+            if st.st_size <= 256:
+                return False
+            if _fresh_gz(src, st) is not None:
+                return False
+            data = f.read()
+        tmp.write_bytes(gzip.compress(data, 9, mtime=0))
+        # 旁路文件的 mtime 对齐到源文件，_fresh_gz 据此判断是否对应同一版本
+        os.utime(tmp, ns=(st.st_atime_ns, st.st_mtime_ns))
+        tmp.replace(gz)
+        return True
+    except OSError:
+        return False
+    finally:
+        try:
+            tmp.unlink()
+        except OSError:
+            pass
+
+
+def _precompress_files(url_paths):
+    """并行预压缩文件列表中已下载的文本资源，返回新生成的 .gz 数量。"""
+    files = [str(SITE_DIR / p.lstrip("/")) for p in url_paths
+             if os.path.splitext(p)[1].lower() in _COMPRESSIBLE]
+    if not files:
+        return 0
+    with ProcessPoolExecutor() as pool:
+        return sum(pool.map(_precompress, files, chunksize=64))
+
+
+def _precompress_site():
+    """预压缩 site/ 下全部文本资源（已是最新的跳过），返回新生成的 .gz 数量。"""
+    return _precompress_files(list(_scan_site()))
+
+
+def _is_sidecar(fp):
+    """fp 是否为某个现存文件的 .gz 旁路文件。旁路文件只能经 gzip 协商发送，
+    直接请求会得到缺少 Content-Encoding 的 gzip 字节。
+    """
+    return fp.suffix == ".gz" and fp.with_suffix("").is_file()
+
+
+def _fresh_gz(fp, st):
+    """返回与源文件当前版本对应的 .gz 旁路文件 (路径, stat)，不存在或不匹配时返回 None。
+    按源文件的 (st_mtime_ns, st_size) 精确匹配：旁路文件 mtime 须与源文件相等
+    （_precompress 写入时对齐），gzip 尾部记录的原始长度 ISIZE 须等于源文件大小。
+    仅比较 mtime 先后会在 rsync -a / tar x / cp -p 回填旧 mtime 后继续使用过期内容。
+    """
+    gz = fp.with_name(fp.name + ".gz")
+    try:
+        gz_st = gz.stat()
+        if gz_st.st_mtime_ns != st.st_mtime_ns or gz_st.st_size < 18:
+            return None
+        with open(gz, "rb") as f:
+            f.seek(-4, os.SEEK_END)
+            isize = int.from_bytes(f.read(4), "little")
+    except OSError:
+        return None
+    return (gz, gz_st) if isize == st.st_size & 0xFFFFFFFF else None
 
 
 def _make_etag(stat):
@@ -325,6 +741,15 @@ def _make_etag(stat):
     return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
 
 
+# _resolve_path 的缓存：原始 URL 路径 → (写入时间, 本地路径或 None)。
+# 同一页面的 CSS/JS/图片会被反复请求，缓存可省去 unquote、is_file 和 resolve；
+# 条目 5 秒过期，按 LRU 最多保留 4096 条
+_PATH_CACHE = OrderedDict()
+_PATH_CACHE_LOCK = threading.Lock()
+_PATH_CACHE_MAX = 4096
+_PATH_CACHE_TTL = 5.0
+
+
 class DualStackHTTPServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
     """多线程 + IPv4/IPv6 双栈 HTTP 服务器。"""
     daemon_threads = True
@@ -359,12 +784,30 @@ class SiteHandler(http.server.BaseHTTPRequestHandler):
     protocol_version = "HTTP/1.1"  # 启用 keep-alive 持久连接
 
     def _resolve_path(self):
-        """路由解析：URL → 本地文件路径。
-        先尝试 URL 解码后的路径（常规文件），再尝试原始路径（percent-encoded 文件名）。
-        """
+        """路由解析：URL → 本地文件路径，结果按原始 URL 路径短时缓存。"""
         raw = self.path.split("?")[0].split("#")[0]
+        now = time.monotonic()
+        with _PATH_CACHE_LOCK:
+            hit = _PATH_CACHE.get(raw)
+            if hit is not None and now - hit[0] < _PATH_CACHE_TTL:
+                _PATH_CACHE.move_to_end(raw)
+                return hit[1]
+        target = self._lookup_path(raw)
+        with _PATH_CACHE_LOCK:
+            _PATH_CACHE[raw] = (now, target)
+            _PATH_CACHE.move_to_end(raw)
+            if len(_PATH_CACHE) > _PATH_CACHE_MAX:
+                _PATH_CACHE.popitem(last=False)
+        return target
+
+    @staticmethod
+    def _lookup_path(raw):
+        """先尝试 URL 解码后的路径（常规文件），再尝试原始路径（percent-encoded 文件名）。"""
         decoded = unquote(raw)
-        site_resolved = SITE_DIR.resolve()
+
+        # 隐藏路径（缓存目录等）一律 404
+        if _is_hidden(decoded) or _is_hidden(raw):
+            return None
 
         # 按优先级尝试两种路径：decoded 和 raw（percent-encoded 原样）
         for candidate in (decoded, raw):
@@ -385,9 +828,11 @@ class SiteHandler(http.server.BaseHTTPRequestHandler):
                 target = fp / "index.html"
             else:
                 continue
+            if _is_sidecar(target):
+                return None
             # 路径穿越防护
             try:
-                target.resolve().relative_to(site_resolved)
+                target.resolve().relative_to(_SITE_RESOLVED)
             except (ValueError, OSError):
                 return None
             return target
@@ -402,79 +847,70 @@ class SiteHandler(http.server.BaseHTTPRequestHandler):
             return
 
         etag = _make_etag(st)
-        ext = fp.suffix.lower()
+        ctype, compressible, cache_control = _EXT_TABLE.get(fp.suffix.lower(), _DEFAULT_ROW)
 
         # ── 条件请求：If-None-Match → 304 ──
         if_none = self.headers.get("If-None-Match")
         if if_none and etag in (t.strip() for t in if_none.split(",")):
             self.send_response(304)
             self.send_header("ETag", etag)
-            self.send_header("Cache-Control", self._cache_control(ext))
-            if ext in _COMPRESSIBLE:
+            self.send_header("Cache-Control", cache_control)
+            if compressible:
                 self.send_header("Vary", "Accept-Encoding")
             self.send_header("Access-Control-Allow-Origin", "*")
             self.end_headers()
             return
 
-        # ── gzip 判断（HEAD 也需要，以保证响应头一致） ──
+        # ── 响应体来源（HEAD 也需要，以保证响应头一致）：
+        #    预压缩的 .gz 旁路文件 > gzip 磁盘缓存 > 原文件 ──
         use_gzip = False
-        if ext in _COMPRESSIBLE and st.st_size > 256:
-            ae = self.headers.get("Accept-Encoding", "")
-            if "gzip" in ae:
-                use_gzip = True
-                body = _gzip_cached(str(fp), st.st_mtime_ns, st.st_size)
-
-        # ── HEAD 请求：返回与 GET 一致的响应头，不发 body ──
-        if head_only:
+        send_path = fp
+        if compressible and st.st_size > 256:
+            if "gzip" in self.headers.get("Accept-Encoding", ""):
+                sidecar = _fresh_gz(fp, st)
+                try:
+                    if sidecar is not None:
+                        send_path = sidecar[0]
+                    else:
+                        send_path = _gzip_path(str(fp), st.st_mtime_ns, st.st_size)
+                    use_gzip = True
+                except OSError:
+                    # 缓存目录不可写等情况下退回发送原文件
+                    send_path = fp
+
+        try:
+            f = open(send_path, "rb")
+        except OSError:
+            self.send_error(500)
+            return
+
+        with f:
+            # 长度取自已打开文件的 fstat：即使文件在 stat() 之后被替换或改写，
+            # Content-Length 与实际发送的字节也一致，不会破坏 keep-alive 连接
+            fst = os.fstat(f.fileno())
+            length = fst.st_size
+            if not use_gzip:
+                st = fst
+                etag = _make_etag(st)
+
+            # ── 发送响应（HEAD 只发响应头） ──
             self.send_response(200)
-            self.send_header("Content-Type", _MIME_MAP.get(ext, "application/octet-stream"))
+            self.send_header("Content-Type", ctype)
+            self.send_header("Content-Length", str(length))
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", cache_control)
+            self.send_header("Last-Modified", self.date_time_string(int(st.st_mtime)))
             if use_gzip:
-                self.send_header("Content-Length", str(len(body)))
                 self.send_header("Content-Encoding", "gzip")
                 self.send_header("Vary", "Accept-Encoding")
-            else:
-                self.send_header("Content-Length", str(st.st_size))
-            self.send_header("ETag", etag)
-            self.send_header("Cache-Control", self._cache_control(ext))
-            self.send_header("Last-Modified", self.date_time_string(int(st.st_mtime)))
             self.send_header("Access-Control-Allow-Origin", "*")
             self.end_headers()
-            return
-
-        # 非 gzip 时才读原始文件
-        if not use_gzip:
-            try:
-                with open(fp, "rb") as f:
-                    body = f.read()
-            except OSError:
-                self.send_error(500)
+            if head_only:
                 return
-
-        ctype = _MIME_MAP.get(ext, "application/octet-stream")
-
-        # ── 发送响应 ──
-        self.send_response(200)
-        self.send_header("Content-Type", ctype)
-        self.send_header("Content-Length", str(len(body)))
-        self.send_header("ETag", etag)
-        self.send_header("Cache-Control", self._cache_control(ext))
-        self.send_header("Last-Modified", self.date_time_string(int(st.st_mtime)))
-        if use_gzip:
-            self.send_header("Content-Encoding", "gzip")
-            self.send_header("Vary", "Accept-Encoding")
-        self.send_header("Access-Control-Allow-Origin", "*")
-        self.end_headers()
-        self.wfile.write(body)
-
-    @staticmethod
-    def _cache_control(ext):
-        if ext in _STATIC_BIN | {'.woff', '.woff2'}:
-            return "public, max-age=604800"        # 7 天 — 图片/字体不变
-        if ext in ('.js', '.css'):
-            return "public, max-age=86400"         # 1 天 — JS/CSS 可能更新
-        if ext == '.html':
-            return "public, max-age=3600"          # 1 小时 — 页面
-        return "public, max-age=3600"
+            # 原文件或 .gz 文件直接交给内核发送（零拷贝，不经过 Python bytes）；
+            # 不支持 os.sendfile 的平台上 socket.sendfile 会自动回退到 send()
+            self.wfile.flush()
+            self.connection.sendfile(f, 0, length)
 
     def do_GET(self):
         fp = self._resolve_path()
@@ -495,29 +931,58 @@ class SiteHandler(http.server.BaseHTTPRequestHandler):
         super().log_message(fmt, *args)
 
 
+def _stdlib_procs():
+    """stdlib 服务器的进程数：支持 fork 的平台按可用 CPU 核数（遵守 taskset/cgroup
+    的亲和性限制），否则单进程。
+    """
+    if not hasattr(os, "fork"):
+        return 1
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
 def _serve_stdlib(port):
-    """stdlib 回退服务器 (HTTP/1.1)。"""
+    """stdlib 回退服务器 (HTTP/1.1)。
+    绑定监听端口后 fork 出多个进程共享同一个套接字（由内核分发连接），
+    每个进程内仍是多线程，从而绕开单进程 GIL 只能用满一个核的限制。
+    """
     with DualStackHTTPServer(("", port), SiteHandler) as httpd:
+        children = []
+        is_child = False
+        # 必须在启动任何线程之前 fork
+        for _i in range(_stdlib_procs() - 1):
+            pid = os.fork()
+            if pid == 0:
+                # 子进程不负责回收先前 fork 出的兄弟进程
+                is_child = True
+                children = []
+                break
+            children.append(pid)
+        if children and not is_child:
+            # 主进程收到 SIGTERM 时按 Ctrl+C 处理，确保子进程一并退出
+            signal.signal(signal.SIGTERM, signal.default_int_handler)
         try:
             httpd.serve_forever()
         except KeyboardInterrupt:
-            print(_("srv_stopped"))
+            if not is_child:
+                print(_("srv_stopped"))
+        finally:
+            if is_child:
+                os._exit(0)
+            for pid in children:
+                try:
+                    os.kill(pid, signal.SIGTERM)
+                    os.waitpid(pid, 0)
+                except OSError:
+                    pass
 
 
 # ─── ASGI 生产服务器 (starlette + hypercorn) ────────────────
 
-_CACHE_MAX_AGE = {
-    '.png': 604800, '.jpg': 604800, '.jpeg': 604800, '.gif': 604800,
-    '.webp': 604800, '.woff': 604800, '.woff2': 604800, '.wav': 604800,
-    '.ico': 604800,
-    '.js': 86400, '.css': 86400,
-    '.html': 3600, '.json': 3600,
-}
-
-
 def _make_asgi_app():
     """构建 ASGI 应用，需要 starlette。"""
-    import hashlib
+    from email.utils import formatdate
     from starlette.applications import Starlette
     from starlette.responses import FileResponse, Response
     from starlette.routing import Route
@@ -526,18 +991,11 @@ def _make_asgi_app():
 
     site = SITE_DIR.resolve()
 
-    try:
-        hashlib.md5(b"", usedforsecurity=False)
-        def _etag_for(st):
-            base = f"{st.st_mtime}-{st.st_size}"
-            return f'"{hashlib.md5(base.encode(), usedforsecurity=False).hexdigest()}"'
-    except TypeError:
-        def _etag_for(st):
-            base = f"{st.st_mtime}-{st.st_size}"
-            return f'"{hashlib.md5(base.encode()).hexdigest()}"'
-
     def _resolve(*candidates):
         """尝试多个路径候选，兼容 decoded 和 percent-encoded 文件名。"""
+        # 隐藏路径（缓存目录等）一律 404
+        if any(_is_hidden(c) for c in candidates):
+            return None
         for candidate in candidates:
             if not candidate or candidate == "/":
                 idx = site / "index" / "index.html"
@@ -554,6 +1012,8 @@ def _make_asgi_app():
                 target = fp / "index.html"
             else:
                 continue
+            if _is_sidecar(target):
+                return None
             try:
                 target.resolve().relative_to(site)
             except (ValueError, OSError):
@@ -572,20 +1032,33 @@ def _make_asgi_app():
             return Response(status_code=404)
 
         st = target.stat()
-        etag = _etag_for(st)
-        ext = target.suffix.lower()
-        max_age = _CACHE_MAX_AGE.get(ext, 3600)
+        # 与 stdlib 引擎同一 ETag 方案，切换引擎后 If-None-Match 仍然有效；
+        # 显式传入以覆盖 FileResponse 自带的 md5 ETag
+        etag = _make_etag(st)
+        ctype, compressible, cache_control = _EXT_TABLE.get(target.suffix.lower(), _DEFAULT_ROW)
+        # Content-Type 与 Last-Modified 都取自源文件，.gz 旁路与原文件响应仅差 Content-Encoding
         extra = {
-            "Cache-Control": f"public, max-age={max_age}",
+            "ETag": etag,
+            "Last-Modified": formatdate(st.st_mtime, usegmt=True),
+            "Cache-Control": cache_control,
             "Access-Control-Allow-Origin": "*",
         }
 
         # 条件请求: If-None-Match → 304
         if_none = request.headers.get("if-none-match", "")
         if if_none == "*" or etag in (t.strip() for t in if_none.split(",")):
-            return Response(status_code=304, headers={"ETag": etag, **extra})
+            return Response(status_code=304, headers=extra)
+
+        # 有预压缩的 .gz 旁路文件时直接发送，GZipMiddleware 见到 Content-Encoding 会跳过
+        if compressible and st.st_size > 256 and "gzip" in request.headers.get("accept-encoding", ""):
+            sidecar = _fresh_gz(target, st)
+            if sidecar is not None:
+                gz, gz_st = sidecar
+                return FileResponse(gz, stat_result=gz_st, media_type=ctype, headers={
+                    **extra, "Content-Encoding": "gzip", "Vary": "Accept-Encoding",
+                })
 
-        return FileResponse(target, stat_result=st, headers=extra)
+        return FileResponse(target, stat_result=st, media_type=ctype, headers=extra)
 
     return Starlette(
         routes=[Route("/{path:path}", handle)],
@@ -650,7 +1123,11 @@ def cmd_serve(args):
     print(_("srv_proto", p=h2_note))
     print(_("srv_addr", url=f"{proto}://localhost:{port}"))
     if not has_asgi:
+        print(_("srv_procs", n=_stdlib_procs()))
         print(_("srv_hint"))
+    # 监听前把文本资源压缩成 .gz 旁路文件，请求路径上不再有压缩开销
+    sys.stdout.flush()
+    print(_("srv_precompress", n=_precompress_site()))
     print(_("srv_stop"))
     print("=" * 55)
 
@@ -663,15 +1140,16 @@ def cmd_serve(args):
 def cmd_status(_args):
     """显示下载进度统计。"""
     all_paths = load_filelist()
+    present = _scan_site()
     existing = 0
     missing = 0
     total_size = 0
     cats = {}
     for p in all_paths:
-        if _file_ok(p):
-            local = SITE_DIR / p.lstrip("/")
+        size = present.get(p.lstrip("/"), 0)
+        if size > 0:
             existing += 1
-            total_size += local.stat().st_size
+            total_size += size
         else:
             missing += 1
             parts = p.strip("/").split("/")
@@ -688,7 +1166,7 @@ def cmd_status(_args):
     print(_("st_progress", pct=pct))
     if cats:
         print(_("st_missing_cats"))
-        for cat, count in sorted(cats.items(), key=lambda x: -x[1])[:15]:
+        for cat, count in heapq.nlargest(15, cats.items(), key=operator.itemgetter(1)):
             print(f"    {cat}: {count}")
     print("=" * 55)
 
@@ -696,20 +1174,74 @@ def cmd_status(_args):
 # ─── 入口 ───────────────────────────────────────────────────
 
 
-def main():
-    global _LANG
-    # 在构建 parser 之前提取 --lang，确保 help 文本也跟随语言切换
-    for i, arg in enumerate(sys.argv[1:], 1):
-        if arg == "--lang" and i < len(sys.argv):
-            val = sys.argv[i + 1] if i + 1 <= len(sys.argv) - 1 else None
-            if val in ("zh", "en"):
-                _LANG = val
-            break
-        if arg.startswith("--lang="):
-            val = arg.split("=", 1)[1]
-            if val in ("zh", "en"):
-                _LANG = val
-            break
+# 子命令 → {参数: 默认值}，快速解析与 argparse 共用
+_CMD_DEFAULTS = {
+    "download": {"workers": 10, "retry": 3},
+    "serve": {"port": 9000, "cert": None, "key": None},
+    "status": {},
+}
+
+def _positive_int(val):
+    """正整数参数的转换函数；0 个并发会让下载永远等待，0 次尝试则直接全部失败。"""
+    n = int(val)
+    if n < 1:
+        raise ValueError(val)
+    return n
+
+
+# 子命令 → {选项: (参数名, 类型)}
+_CMD_FLAGS = {
+    "download": {"-w": ("workers", _positive_int), "--workers": ("workers", _positive_int),
+                 "-r": ("retry", _positive_int), "--retry": ("retry", _positive_int)},
+    "serve": {"-p": ("port", int), "--port": ("port", int),
+              "--cert": ("cert", str), "--key": ("key", str)},
+    "status": {},
+}
+
+
+def _parse_fast(argv):
+    """常见命令行的快速解析，无需导入 argparse。
+    仅处理 "<子命令> [--选项 值 | --选项=值]..."，其余情况（--help、未知参数、
+    类型错误等）返回 None，交给 argparse 处理并给出标准报错。
+    """
+    if not argv or argv[0] not in _CMD_FLAGS:
+        return None
+    cmd = argv[0]
+    flags = _CMD_FLAGS[cmd]
+    values = {"command": cmd, "lang": None, **_CMD_DEFAULTS[cmd]}
+    rest = argv[1:]
+    i = 0
+    while i < len(rest):
+        if rest[i].startswith("--") and "=" in rest[i]:
+            name, val = rest[i].split("=", 1)
+            i += 1
+        elif i + 1 < len(rest):
+            name, val = rest[i], rest[i + 1]
+            i += 2
+        else:
+            return None
+        if name not in flags:
+            return None
+        key, conv = flags[name]
+        # 值看起来像选项（如 "--cert --key"）时交给 argparse 报 "expected one argument"
+        if val.startswith("-"):
+            return None
+        try:
+            values[key] = conv(val)
+        except ValueError:
+            return None
+    return types.SimpleNamespace(**values)
+
+
+def _parse_argparse():
+    """完整的 argparse 解析（含 --help 与错误提示）。"""
+    import argparse
+
+    def positive_int(val):
+        try:
+            return _positive_int(val)
+        except ValueError:
+            raise argparse.ArgumentTypeError(_("ap_positive", v=val)) from None
 
     parser = argparse.ArgumentParser(
         description=_("ap_desc"),
@@ -720,17 +1252,42 @@ def main():
     sub = parser.add_subparsers(dest="command")
 
     dl = sub.add_parser("download", help=_("ap_dl"))
-    dl.add_argument("-w", "--workers", type=int, default=10, help=_("ap_workers"))
-    dl.add_argument("-r", "--retry", type=int, default=3, help=_("ap_retry"))
+    dl.add_argument("-w", "--workers", type=positive_int,
+                    default=_CMD_DEFAULTS["download"]["workers"], help=_("ap_workers"))
+    dl.add_argument("-r", "--retry", type=positive_int,
+                    default=_CMD_DEFAULTS["download"]["retry"], help=_("ap_retry"))
 
     sv = sub.add_parser("serve", help=_("ap_serve"))
-    sv.add_argument("-p", "--port", type=int, default=9000, help=_("ap_port"))
+    sv.add_argument("-p", "--port", type=int,
+                    default=_CMD_DEFAULTS["serve"]["port"], help=_("ap_port"))
     sv.add_argument("--cert", help=_("ap_cert"))
     sv.add_argument("--key", help=_("ap_key"))
 
     sub.add_parser("status", help=_("ap_status"))
 
-    args = parser.parse_args()
+    return parser, parser.parse_args()
+
+
+def main():
+    global _LANG
+    # 在构建 parser 之前提取 --lang，确保 help 文本也跟随语言切换
+    for i, arg in enumerate(sys.argv[1:], 1):
+        if arg == "--lang" and i < len(sys.argv):
+            val = sys.argv[i + 1] if i + 1 <= len(sys.argv) - 1 else None
+            if val in ("zh", "en"):
+                _LANG = val
+            break
+        if arg.startswith("--lang="):
+            val = arg.split("=", 1)[1]
+            if val in ("zh", "en"):
+                _LANG = val
+            break
+
+    # 常见调用（如 "serve -p 3000"）走快速路径，启动时不必导入和构建 argparse
+    parser = None
+    args = _parse_fast(sys.argv[1:])
+    if args is None:
+        parser, args = _parse_argparse()
     if args.command == "download":
         cmd_download(args)
     elif args.command == "serve":